@@ -1,15 +1,18 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from huggingface_hub import InferenceClient
 import pygal
-import pdfplumber
+import ahocorasick
 import matplotlib.pyplot as plt
 import io
 import base64
-import time
+import codecs
 import re
+from collections import Counter
 from datetime import datetime, timedelta
-import json
+import orjson
+from pdf_extraction import extract_pdf_pages
 
 # Page configuration
 st.set_page_config(
@@ -67,6 +70,8 @@ if "policy_text" not in st.session_state:
     st.session_state.policy_text = ""
 if "analysis_results" not in st.session_state:
     st.session_state.analysis_results = None
+if "chart_uri" not in st.session_state:
+    st.session_state.chart_uri = None
 
 # Sidebar for configuration
 with st.sidebar:
@@ -114,6 +119,79 @@ with st.sidebar:
         """
         st.success("EPA sample loaded!")
 
+# Precompiled patterns (compiled once at import instead of on every analysis)
+# Common policy document sections
+_SECTION_RES = {
+    section: re.compile(pattern, re.IGNORECASE | re.DOTALL)
+    for section, pattern in {
+        "summary": r"SUMMARY:?\s*(.*?)(?=\n[A-Z][A-Z\s]+:|$)",
+        "background": r"BACKGROUND:?\s*(.*?)(?=\n[A-Z][A-Z\s]+:|$)",
+        "dates": r"DATES?:?\s*(.*?)(?=\n[A-Z][A-Z\s]+:|$)",
+        "economic_impact": r"ECONOMIC IMPACT:?\s*(.*?)(?=\n[A-Z][A-Z\s]+:|$)",
+        "effective_date": r"(?:effective|EFFECTIVE).*?(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{4}|\w+ \d{1,2}, \d{4})",
+    }.items()
+}
+
+_DATE_RES = [
+    re.compile(r'\b(\w+ \d{1,2}, \d{4})\b'),
+    re.compile(r'\b(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{4})\b'),
+    re.compile(r'\b(\d{4}-\d{2}-\d{2})\b')
+]
+
+_STAKEHOLDER_RES = [
+    re.compile(r'\b(businesses?|companies|corporations?|firms?)\b'),
+    re.compile(r'\b(citizens?|public|communities?|consumers?)\b'),
+    re.compile(r'\b(government|agencies?|departments?)\b'),
+    re.compile(r'\b(environmental groups?|advocacy|organizations?)\b')
+]
+
+_SENTENCE_SPLIT_RE = re.compile(r'[.!?]+')
+
+# Maximum document size accepted for analysis (extracted PDF text is capped
+# at the same number of characters)
+MAX_DOC_BYTES = 2_000_000
+
+# Entries kept by each cache keyed on full document content, shared by all sessions
+DOC_CACHE_ENTRIES = 8
+
+# Summarization-tuned model served by the HuggingFace Inference API
+SUMMARY_MODEL = "facebook/bart-large-cnn"
+
+# Keyword lists used by the bias and impact scorers
+_BIAS_TERMS = {
+    "positive": ["benefit", "improve", "enhance", "opportunity", "growth"],
+    "negative": ["burden", "costly", "difficult", "challenge", "restrict"],
+    "business": ["industry", "business", "company", "economic"],
+    "public": ["citizen", "public", "community", "environmental"],
+}
+
+# Impact categories: (keywords, keyword hits at which the score saturates)
+_IMPACT_CATEGORIES = {
+    "compliance_complexity": (["requirement", "shall", "must", "compliance", "regulation", "standard"], 10),
+    "cost_impact": (["cost", "fee", "penalty", "fine", "expense", "budget"], 5),
+    "timeline_urgency": (["immediate", "within", "days", "effective", "deadline"], 8),
+    "scope_breadth": (["all", "every", "entire", "comprehensive", "broad", "wide"], 6),
+}
+
+_IMPACT_TERMS = {category: terms for category, (terms, _) in _IMPACT_CATEGORIES.items()}
+_IMPACT_DIVISORS = np.array([divisor for _, divisor in _IMPACT_CATEGORIES.values()], dtype=float)
+
+def _build_keyword_automaton():
+    """Build one Aho-Corasick automaton over every scorer keyword"""
+    # A term may appear in several categories; each listing counts separately
+    term_categories = {}
+    for category, terms in {**_BIAS_TERMS, **_IMPACT_TERMS}.items():
+        for term in terms:
+            term_categories.setdefault(term, []).append(category)
+    
+    automaton = ahocorasick.Automaton()
+    for term, categories in term_categories.items():
+        automaton.add_word(term, tuple(categories))
+    automaton.make_automaton()
+    return automaton
+
+_KEYWORD_AUTOMATON = _build_keyword_automaton()
+
 # Core analysis functions
 def initialize_client(token):
     """Initialize HuggingFace inference client"""
@@ -125,44 +203,68 @@ def initialize_client(token):
         st.error(f"Failed to initialize client: {str(e)}")
         return None
 
+@st.cache_data(show_spinner=False, max_entries=DOC_CACHE_ENTRIES)
+def extract_pdf_text(file_bytes):
+    """Extract at most MAX_DOC_BYTES characters from a PDF, returning (text, truncated)"""
+    # One extra character tells a document exactly at the cap from a longer one
+    text = extract_pdf_pages(file_bytes, MAX_DOC_BYTES + 1)
+    return text[:MAX_DOC_BYTES], len(text) > MAX_DOC_BYTES
+
 def extract_key_sections(text):
     """Extract key sections from policy document"""
     sections = {}
     
-    # Common policy document sections
-    patterns = {
-        "summary": r"SUMMARY:?\s*(.*?)(?=\n[A-Z][A-Z\s]+:|$)",
-        "background": r"BACKGROUND:?\s*(.*?)(?=\n[A-Z][A-Z\s]+:|$)",
-        "dates": r"DATES?:?\s*(.*?)(?=\n[A-Z][A-Z\s]+:|$)",
-        "economic_impact": r"ECONOMIC IMPACT:?\s*(.*?)(?=\n[A-Z][A-Z\s]+:|$)",
-        "effective_date": r"(?:effective|EFFECTIVE).*?(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{4}|\w+ \d{1,2}, \d{4})",
-    }
-    
-    for section, pattern in patterns.items():
-        match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
+    for section, pattern in _SECTION_RES.items():
+        match = pattern.search(text)
         if match:
             sections[section] = match.group(1).strip()[:500]  # Limit length
     
     return sections
 
-def analyze_policy_with_fallback(text, client=None):
-    """Analyze policy with fallback to rule-based analysis if API fails"""
+def analyze_policy(text, client=None):
+    """Analyze policy with the AI models when a client is given, rule-based otherwise"""
     
     # Extract key sections
     sections = extract_key_sections(text)
     
-    # Fallback analysis (rule-based) if no client
-    if not client:
-        return create_fallback_analysis(text, sections)
+    # Lowercase and count keywords once, shared across all scorers
+    text_lower = text.lower()
+    keyword_counts = count_keywords(text_lower)
+    
+    if client:
+        return analyze_with_ai(text, text_lower, keyword_counts, sections, client)
+    return create_fallback_analysis(text, text_lower, keyword_counts, sections)
+
+@st.cache_data(show_spinner=False, max_entries=DOC_CACHE_ENTRIES)
+def cached_ai_analysis(text, token):
+    """Run the AI analysis once per (document, token) pair"""
+    # Failures raise rather than return, and st.cache_data never caches a call
+    # that raised, so a transient API error is retried on the next click
+    client = initialize_client(token)
+    if client is None:
+        raise RuntimeError("HuggingFace client unavailable")
+    return analyze_policy(text, client)
+
+@st.cache_data(show_spinner=False, max_entries=DOC_CACHE_ENTRIES)
+def cached_fallback_analysis(text):
+    """Run the rule-based analysis, which depends only on the document text"""
+    return analyze_policy(text)
+
+def analyze_policy_with_fallback(text, token=None):
+    """Analyze policy with fallback to rule-based analysis if API fails"""
+    
+    # Fallback analysis (rule-based) if no token
+    if not token:
+        return cached_fallback_analysis(text)
     
     try:
         # Try AI analysis first
-        return analyze_with_ai(text, sections, client)
+        return cached_ai_analysis(text, token)
     except Exception as e:
         st.warning(f"AI analysis failed ({str(e)}), using fallback analysis")
-        return create_fallback_analysis(text, sections)
+        return cached_fallback_analysis(text)
 
-def analyze_with_ai(text, sections, client):
+def analyze_with_ai(text, text_lower, keyword_counts, sections, client):
     """AI-powered analysis using HuggingFace models"""
     
     # Truncate text for API limits
@@ -176,45 +278,59 @@ def analyze_with_ai(text, sections, client):
         "stakeholders": []
     }
     
-    # Generate summary
-    try:
-        summary_prompt = f"Summarize this policy document in plain business language, focusing on practical impacts:\n\n{text_snippet}"
-        summary_response = client.text_generation(
-            summary_prompt,
-            model="microsoft/DialoGPT-medium",  # Using available model
-            max_new_tokens=200
-        )
-        results["summary"] = summary_response
-    except:
-        results["summary"] = create_rule_based_summary(text, sections)
+    # Generate summary (failures propagate so the degraded result is never cached)
+    results["summary"] = client.summarization(
+        text_snippet,
+        model=SUMMARY_MODEL,
+        parameters={"max_length": 200}
+    )
     
     # Bias analysis
     if sections:
-        bias_indicators = analyze_bias_patterns(text)
+        bias_indicators = analyze_bias_patterns(keyword_counts)
         results["bias_analysis"] = bias_indicators
     
     # Impact scoring
-    results["impact_scores"] = calculate_impact_scores(text, sections)
+    results["impact_scores"] = calculate_impact_scores(keyword_counts, sections)
     
     # Extract dates and stakeholders
     results["key_dates"] = extract_dates(text)
-    results["stakeholders"] = extract_stakeholders(text)
+    results["stakeholders"] = extract_stakeholders(text_lower)
     
     return results
 
-def create_fallback_analysis(text, sections):
+def create_fallback_analysis(text, text_lower, keyword_counts, sections):
     """Rule-based fallback analysis"""
     
     results = {
         "summary": create_rule_based_summary(text, sections),
-        "bias_analysis": analyze_bias_patterns(text),
-        "impact_scores": calculate_impact_scores(text, sections),
+        "bias_analysis": analyze_bias_patterns(keyword_counts),
+        "impact_scores": calculate_impact_scores(keyword_counts, sections),
         "key_dates": extract_dates(text),
-        "stakeholders": extract_stakeholders(text)
+        "stakeholders": extract_stakeholders(text_lower)
     }
     
     return results
 
+def first_sentences(text, n=3, min_len=20):
+    """Return the first n sentences longer than min_len, scanning only as far as needed"""
+    sentences = []
+    last = 0
+    for match in _SENTENCE_SPLIT_RE.finditer(text):
+        sentence = text[last:match.start()].strip()
+        last = match.end()
+        if len(sentence) > min_len:
+            sentences.append(sentence)
+            if len(sentences) == n:
+                return sentences
+    
+    # Trailing text after the final punctuation mark
+    sentence = text[last:].strip()
+    if len(sentence) > min_len:
+        sentences.append(sentence)
+    
+    return sentences
+
 def create_rule_based_summary(text, sections):
     """Create summary using rule-based approach"""
     
@@ -222,8 +338,7 @@ def create_rule_based_summary(text, sections):
         return f"**Key Points:** {sections['summary'][:300]}..."
     
     # Extract first few sentences
-    sentences = re.split(r'[.!?]+', text)
-    key_sentences = [s.strip() for s in sentences[:3] if len(s.strip()) > 20]
+    key_sentences = first_sentences(text)
     
     summary = " ".join(key_sentences)
     if len(summary) > 400:
@@ -231,8 +346,16 @@ def create_rule_based_summary(text, sections):
     
     return summary
 
-def analyze_bias_patterns(text):
-    """Analyze potential bias patterns in the document"""
+def count_keywords(text_lower):
+    """Count keyword occurrences per category in a single pass over the text"""
+    counts = Counter()
+    for _, categories in _KEYWORD_AUTOMATON.iter(text_lower):
+        for category in categories:
+            counts[category] += 1
+    return counts
+
+def analyze_bias_patterns(keyword_counts):
+    """Analyze potential bias patterns from the document's keyword counts"""
     
     bias_indicators = {
         "language_bias": 0,
@@ -242,12 +365,8 @@ def analyze_bias_patterns(text):
     }
     
     # Language bias indicators
-    positive_words = ["benefit", "improve", "enhance", "opportunity", "growth"]
-    negative_words = ["burden", "costly", "difficult", "challenge", "restrict"]
-    
-    text_lower = text.lower()
-    pos_count = sum(text_lower.count(word) for word in positive_words)
-    neg_count = sum(text_lower.count(word) for word in negative_words)
+    pos_count = keyword_counts["positive"]
+    neg_count = keyword_counts["negative"]
     
     if pos_count > neg_count * 2:
         bias_indicators["language_bias"] = 0.7
@@ -257,11 +376,8 @@ def analyze_bias_patterns(text):
         bias_indicators["details"].append("Document uses predominantly negative language")
     
     # Stakeholder bias
-    business_terms = ["industry", "business", "company", "economic"]
-    public_terms = ["citizen", "public", "community", "environmental"]
-    
-    business_count = sum(text_lower.count(term) for term in business_terms)
-    public_count = sum(text_lower.count(term) for term in public_terms)
+    business_count = keyword_counts["business"]
+    public_count = keyword_counts["public"]
     
     if business_count > public_count * 2:
         bias_indicators["stakeholder_bias"] = 0.6
@@ -272,78 +388,61 @@ def analyze_bias_patterns(text):
     
     return bias_indicators
 
-def calculate_impact_scores(text, sections):
-    """Calculate various impact scores"""
-    
-    scores = {
-        "compliance_complexity": 0,
-        "cost_impact": 0,
-        "timeline_urgency": 0,
-        "scope_breadth": 0
-    }
-    
-    text_lower = text.lower()
-    
-    # Compliance complexity
-    complex_terms = ["requirement", "shall", "must", "compliance", "regulation", "standard"]
-    complexity_score = min(sum(text_lower.count(term) for term in complex_terms) / 10, 1.0)
-    scores["compliance_complexity"] = complexity_score
-    
-    # Cost impact
-    cost_terms = ["cost", "fee", "penalty", "fine", "expense", "budget"]
-    cost_score = min(sum(text_lower.count(term) for term in cost_terms) / 5, 1.0)
-    scores["cost_impact"] = cost_score
-    
-    # Timeline urgency
-    urgent_terms = ["immediate", "within", "days", "effective", "deadline"]
-    urgency_score = min(sum(text_lower.count(term) for term in urgent_terms) / 8, 1.0)
-    scores["timeline_urgency"] = urgency_score
-    
-    # Scope breadth
-    scope_terms = ["all", "every", "entire", "comprehensive", "broad", "wide"]
-    scope_score = min(sum(text_lower.count(term) for term in scope_terms) / 6, 1.0)
-    scores["scope_breadth"] = scope_score
+def calculate_impact_scores(keyword_counts, sections):
+    """Calculate various impact scores from the document's keyword counts"""
+    
+    # Scale each category's hits by its divisor and cap at 1.0 in one vectorized step
+    counts = np.fromiter(
+        (keyword_counts[category] for category in _IMPACT_CATEGORIES),
+        dtype=float,
+        count=len(_IMPACT_CATEGORIES)
+    )
+    scores = np.minimum(counts / _IMPACT_DIVISORS, 1.0)
     
-    return scores
+    return dict(zip(_IMPACT_CATEGORIES, scores.tolist()))
 
-def extract_dates(text):
+def extract_dates(text, limit=5):
     """Extract important dates from the document"""
     
-    date_patterns = [
-        r'\b(\w+ \d{1,2}, \d{4})\b',
-        r'\b(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{4})\b',
-        r'\b(\d{4}-\d{2}-\d{2})\b'
-    ]
-    
-    dates = []
-    for pattern in date_patterns:
-        matches = re.findall(pattern, text)
-        dates.extend(matches)
+    # Ordered unique accumulator; stop scanning once enough dates are found
+    dates = {}
+    for pattern in _DATE_RES:
+        for match in pattern.finditer(text):
+            dates.setdefault(match.group(1))
+            if len(dates) >= limit:
+                return list(dates)
     
-    return list(set(dates))[:5]  # Return unique dates, max 5
+    return list(dates)
 
-def extract_stakeholders(text):
-    """Extract stakeholders mentioned in the document"""
+def extract_stakeholders(text_lower, limit=8):
+    """Extract stakeholders mentioned in the (lowercased) document"""
     
-    stakeholder_patterns = [
-        r'\b(businesses?|companies|corporations?|firms?)\b',
-        r'\b(citizens?|public|communities?|consumers?)\b',
-        r'\b(government|agencies?|departments?)\b',
-        r'\b(environmental groups?|advocacy|organizations?)\b'
-    ]
-    
-    stakeholders = set()
-    text_lower = text.lower()
+    stakeholders = {}
+    for pattern in _STAKEHOLDER_RES:
+        for match in pattern.finditer(text_lower):
+            stakeholders.setdefault(match.group(1))
+            if len(stakeholders) >= limit:
+                return list(stakeholders)
     
-    for pattern in stakeholder_patterns:
-        matches = re.findall(pattern, text_lower)
-        stakeholders.update(matches)
-    
-    return list(stakeholders)[:8]
+    return list(stakeholders)
 
 def create_impact_visualization(scores):
     """Create impact score visualization using pygal"""
     
+    # Convert scores to whole percentages so equal charts share a cache entry
+    score_values = (
+        int(scores.get('compliance_complexity', 0) * 100),
+        int(scores.get('cost_impact', 0) * 100),
+        int(scores.get('timeline_urgency', 0) * 100),
+        int(scores.get('scope_breadth', 0) * 100)
+    )
+    
+    return render_radar_chart(score_values)
+
+@st.cache_data(show_spinner=False)
+def render_radar_chart(score_values):
+    """Render the impact radar chart as a data URI, cached on the percentages"""
+    
     # Create radar chart
     radar_chart = pygal.Radar()
     radar_chart.title = 'Policy Impact Assessment'
@@ -354,15 +453,7 @@ def create_impact_visualization(scores):
         'Scope Breadth'
     ]
     
-    # Convert scores to percentages
-    score_values = [
-        scores.get('compliance_complexity', 0) * 100,
-        scores.get('cost_impact', 0) * 100,
-        scores.get('timeline_urgency', 0) * 100,
-        scores.get('scope_breadth', 0) * 100
-    ]
-    
-    radar_chart.add('Impact Level', score_values)
+    radar_chart.add('Impact Level', list(score_values))
     
     return radar_chart.render_data_uri()
 
@@ -413,10 +504,19 @@ if uploaded_file is not None:
     with st.spinner("📖 Extracting document content..."):
         try:
             if uploaded_file.type == "application/pdf":
-                with pdfplumber.open(uploaded_file) as pdf:
-                    text = "\n".join([page.extract_text() or "" for page in pdf.pages])
+                text, truncated = extract_pdf_text(uploaded_file.getvalue())
+                limit = f"{MAX_DOC_BYTES:,} characters"
             else:
-                text = uploaded_file.read().decode("utf-8")
+                # Read at most MAX_DOC_BYTES and decode strictly; when truncated,
+                # a multi-byte character split at the cut is dropped rather than
+                # raising, while invalid UTF-8 anywhere else still errors
+                truncated = uploaded_file.size > MAX_DOC_BYTES
+                decoder = codecs.getincrementaldecoder("utf-8")()
+                text = decoder.decode(uploaded_file.read(MAX_DOC_BYTES), final=not truncated)
+                limit = f"{MAX_DOC_BYTES:,} bytes"
+            
+            if truncated:
+                st.warning(f"⚠️ Document truncated to the first {limit}")
             
             st.session_state.policy_text = text
             
@@ -435,22 +535,14 @@ if st.session_state.policy_text:
     
     if st.button("🚀 Analyze Document", type="primary"):
         
-        # Initialize client
-        client = initialize_client(hf_token) if hf_token else None
-        
         with st.spinner("🤖 Analyzing policy document..."):
-            progress_bar = st.progress(0)
-            
-            # Simulate progress
-            for i in range(100):
-                time.sleep(0.01)
-                progress_bar.progress(i + 1)
-            
-            # Perform analysis
-            results = analyze_policy_with_fallback(st.session_state.policy_text, client)
+            # Perform analysis (successful runs are cached on document text and token)
+            results = analyze_policy_with_fallback(st.session_state.policy_text, hf_token)
             st.session_state.analysis_results = results
             
-            progress_bar.empty()
+            # Render the chart once per analysis; reruns only read it back
+            st.session_state.chart_uri = create_impact_visualization(results['impact_scores'])
+            
             st.success("✅ Analysis complete!")
 
 # Display results
@@ -473,8 +565,8 @@ if st.session_state.analysis_results:
         col1, col2 = st.columns([2, 1])
         
         with col1:
-            # Create and display radar chart
-            chart_uri = create_impact_visualization(results['impact_scores'])
+            # Display radar chart rendered at analysis time
+            chart_uri = st.session_state.chart_uri
             if chart_uri:
                 st.markdown(f'<img src="{chart_uri}" width="100%">', unsafe_allow_html=True)
         
@@ -540,7 +632,7 @@ if st.session_state.analysis_results:
     
     with col2:
         # JSON export
-        json_data = json.dumps(results, indent=2)
+        json_data = orjson.dumps(results, option=orjson.OPT_INDENT_2)
         st.download_button(
             label="📊 Download JSON",
             data=json_data,
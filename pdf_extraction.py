@@ -0,0 +1,87 @@
+"""PDF text extraction for PolicyBriefly.
+
+Large documents are split across worker interpreters that run this file as a
+script, so the worker code never depends on app.py (which Streamlit execs as
+the __main__ module).
+"""
+import io
+import os
+import subprocess
+import sys
+
+from pdfminer.converter import TextConverter
+from pdfminer.layout import LAParams
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+
+# Upper bound on worker processes used for PDF extraction
+PDF_WORKERS = min(4, os.cpu_count() or 1)
+
+# Fewest pages a worker should get before a process is worth starting
+MIN_PAGES_PER_WORKER = 8
+
+def extract_pdf_page_range(file_bytes, start, stop, max_chars):
+    """Extract up to max_chars of text from pages [start, stop), stopping early once reached"""
+    resource_manager = PDFResourceManager()
+    output = io.StringIO()
+    # Line grouping keeps the "\n" breaks the section regexes rely on;
+    # boxes_flow=None skips the hierarchical textbox ordering pass
+    with TextConverter(resource_manager, output, laparams=LAParams(boxes_flow=None)) as device:
+        interpreter = PDFPageInterpreter(resource_manager, device)
+        for page in PDFPage.get_pages(io.BytesIO(file_bytes), pagenos=range(start, stop)):
+            interpreter.process_page(page)
+            if output.tell() >= max_chars:
+                break
+    return output.getvalue()[:max_chars]
+
+def extract_pdf_pages(file_bytes, max_chars):
+    """Extract up to max_chars of text, spreading large documents over processes"""
+    page_count = sum(1 for _ in PDFPage.get_pages(io.BytesIO(file_bytes)))
+
+    workers = min(PDF_WORKERS, page_count // MIN_PAGES_PER_WORKER)
+    if workers <= 1:
+        return extract_pdf_page_range(file_bytes, 0, page_count, max_chars)
+
+    # Split pages into contiguous ranges, one per worker, and keep page order.
+    # Workers are fresh interpreters started with fork+exec: forking the
+    # multi-threaded Streamlit server could deadlock on a lock held by another
+    # thread, and multiprocessing's spawn/forkserver would re-run app.py (the
+    # __main__ module under Streamlit) in every worker.
+    step = -(-page_count // workers)
+    processes = [
+        subprocess.Popen(
+            [
+                sys.executable, os.path.abspath(__file__),
+                str(start), str(min(start + step, page_count)), str(max_chars)
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE
+        )
+        for start in range(0, page_count, step)
+    ]
+    try:
+        # Workers read all of stdin before parsing, so every range starts
+        # before any output is collected
+        for process in processes:
+            process.stdin.write(file_bytes)
+            process.stdin.close()
+        chunks = [process.stdout.read().decode("utf-8") for process in processes]
+    except BaseException:
+        for process in processes:
+            process.kill()
+        raise
+    finally:
+        for process in processes:
+            process.stdout.close()
+            process.wait()
+
+    failed = [process.returncode for process in processes if process.returncode != 0]
+    if failed:
+        raise RuntimeError(f"PDF extraction worker failed (exit code {failed[0]})")
+    return "".join(chunks)[:max_chars]
+
+if __name__ == "__main__":
+    # Worker entry point: python pdf_extraction.py START STOP MAX_CHARS < document.pdf
+    start, stop, max_chars = map(int, sys.argv[1:4])
+    text = extract_pdf_page_range(sys.stdin.buffer.read(), start, stop, max_chars)
+    sys.stdout.buffer.write(text.encode("utf-8"))